@@ -1,26 +1,45 @@
-import whisper
+from faster_whisper import BatchedInferencePipeline, WhisperModel
+import numpy as np
 import os
-from typing import Optional
+import threading
+from typing import BinaryIO, Optional, Union
 
 # Load Whisper model (tiny for speed, can use base/small/medium for accuracy)
 MODEL = None
+MODEL_SIZE = os.getenv("WHISPER_MODEL", "tiny")
+_MODEL_LOCK = threading.Lock()
 
+# Speech segments (split by the built-in Silero VAD) decoded together per batch
+PIPELINE = None
+BATCH_SIZE = int(os.getenv("WHISPER_BATCH_SIZE", "8"))
 
-def load_whisper_model(model_size: str = "tiny"):
-    """Load Whisper model - call this on startup"""
-    global MODEL
-    if MODEL is None:
-        MODEL = whisper.load_model(model_size)
+
+def load_whisper_model(model_size: str = MODEL_SIZE):
+    """Load Whisper model (CTranslate2, int8 on CPU) - call this on startup"""
+    global MODEL, PIPELINE
+    with _MODEL_LOCK:
+        if MODEL is None:
+            MODEL = WhisperModel(model_size, device="cpu", compute_type="int8", cpu_threads=os.cpu_count() or 0)
+            PIPELINE = BatchedInferencePipeline(model=MODEL)
     return MODEL
 
 
-def transcribe_audio(audio_file_path: str) -> str:
-    """Transcribe audio file to text using Whisper"""
-    if MODEL is None:
+def warmup_whisper_model(model_size: str = MODEL_SIZE):
+    """Load Whisper and run one second of silence through it so the first request is warm"""
+    model = load_whisper_model(model_size)
+    # Bypass the VAD pipeline: it would drop the silence without running the model
+    segments, _ = model.transcribe(np.zeros(16000, dtype=np.float32), beam_size=1)
+    list(segments)
+
+
+def transcribe_audio(audio: Union[str, BinaryIO, np.ndarray]) -> str:
+    """Transcribe audio (file path, in-memory file or 16kHz float32 array) to text using Whisper"""
+    if PIPELINE is None:
         load_whisper_model()
 
     try:
-        result = MODEL.transcribe(audio_file_path)
-        return result["text"].strip()
+        # VAD splits the clip into speech segments (skipping silence), decoded in batches
+        segments, _ = PIPELINE.transcribe(audio, beam_size=1, batch_size=BATCH_SIZE)
+        return " ".join(segment.text.strip() for segment in segments).strip()
     except Exception as e:
         raise Exception(f"Whisper transcription error: {str(e)}")
@@ -1,96 +1,321 @@
 import sqlite3
-from datetime import datetime
-from typing import List, Dict
+import threading
+from datetime import date, datetime
+from typing import List, Dict, Optional
 import os
 
 # Database at project root: expense-tracker/database/expenses.db
 _BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATABASE_PATH = os.path.join(_BASE_DIR, "database", "expenses.db")
 
+# Single shared connection (opened once) and a lock that serializes writers
+_CONN = None
+_LOCK = threading.Lock()
 
-def init_database():
-    """Initialize SQLite database and create expenses table"""
-    db_dir = os.path.dirname(DATABASE_PATH)
-    os.makedirs(db_dir, exist_ok=True)
 
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
+def get_connection() -> sqlite3.Connection:
+    """Return the shared SQLite connection, opening it in WAL mode on first use"""
+    global _CONN
+    if _CONN is None:
+        with _LOCK:
+            if _CONN is None:
+                os.makedirs(os.path.dirname(DATABASE_PATH), exist_ok=True)
+                conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False, isolation_level=None)
+                conn.row_factory = sqlite3.Row
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.execute("PRAGMA temp_store=MEMORY")
+                conn.execute("PRAGMA mmap_size=268435456")
+                _CONN = conn
+    return _CONN
 
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS expenses (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            date TEXT NOT NULL,
-            category TEXT NOT NULL,
-            amount REAL NOT NULL,
-            currency TEXT DEFAULT 'USD',
-            raw_text TEXT,
-            created_at TEXT DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
 
-    conn.commit()
-    conn.close()
+def init_database():
+    """Initialize SQLite database and create expenses table"""
+    cursor = get_connection().cursor()
+
+    with _LOCK:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS expenses (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                date TEXT NOT NULL,
+                category TEXT NOT NULL,
+                amount REAL NOT NULL,
+                currency TEXT DEFAULT 'USD',
+                raw_text TEXT,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_expenses_date ON expenses(date DESC)")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS expense_jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        # Extraction cache keys include the day (relative dates depend on it), so rows are
+        # only useful on the day they were written; the day column lets old ones be purged
+        columns = [row["name"] for row in cursor.execute("PRAGMA table_info(llm_cache)")]
+        if columns and "day" not in columns:
+            cursor.execute("DROP TABLE llm_cache")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                k TEXT PRIMARY KEY,
+                v TEXT NOT NULL,
+                day TEXT NOT NULL
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_day ON llm_cache(day)")
+        cursor.execute("DELETE FROM llm_cache WHERE day < ?", (date.today().isoformat(),))
 
 
 def save_expense(date: str, category: str, amount: float, currency: str, raw_text: str) -> int:
     """Save expense to database"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        INSERT INTO expenses (date, category, amount, currency, raw_text)
-        VALUES (?, ?, ?, ?, ?)
-    """, (date, category, amount, currency, raw_text))
+    cursor = get_connection().cursor()
 
-    expense_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+    with _LOCK:
+        cursor.execute("""
+            INSERT INTO expenses (date, category, amount, currency, raw_text)
+            VALUES (?, ?, ?, ?, ?)
+        """, (date, category, amount, currency, raw_text))
+        expense_id = cursor.lastrowid
 
     return expense_id
 
 
+def save_expenses_bulk(rows: List[tuple]) -> int:
+    """Save many (date, category, amount, currency, raw_text) rows in a single transaction"""
+    cursor = get_connection().cursor()
+
+    with _LOCK:
+        cursor.execute("BEGIN")
+        try:
+            cursor.executemany("""
+                INSERT INTO expenses (date, category, amount, currency, raw_text)
+                VALUES (?, ?, ?, ?, ?)
+            """, rows)
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+        cursor.execute("COMMIT")
+
+    return len(rows)
+
+
 def get_expense(expense_id: int) -> Dict:
     """Retrieve single expense by ID"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
+    cursor = get_connection().cursor()
 
     cursor.execute("SELECT * FROM expenses WHERE id = ?", (expense_id,))
     row = cursor.fetchone()
-    conn.close()
 
     return dict(row) if row else None
 
 
+def _month_bounds(year: int, month: int) -> tuple:
+    """Half-open [first of month, first of next month) date range so the date index is used"""
+    start = datetime(year, month, 1)
+    end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    return start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")
+
+
 def get_monthly_expenses(year: int, month: int) -> List[Dict]:
     """Get all expenses for a specific month"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-
-    # Match YYYY-MM format at start of date string
-    date_pattern = f"{year}-{month:02d}%"
+    cursor = get_connection().cursor()
 
     cursor.execute("""
         SELECT * FROM expenses
-        WHERE date LIKE ?
+        WHERE date >= ? AND date < ?
         ORDER BY date DESC
-    """, (date_pattern,))
+    """, _month_bounds(year, month))
+
+    rows = cursor.fetchall()
+
+    return [dict(row) for row in rows]
+
+
+def monthly_category_totals(year: int, month: int) -> List[Dict]:
+    """Get total amount and count per category (and currency) for a specific month"""
+    cursor = get_connection().cursor()
+
+    cursor.execute("""
+        SELECT category, currency, SUM(amount) AS total, COUNT(*) AS count
+        FROM expenses
+        WHERE date >= ? AND date < ?
+        GROUP BY category, currency
+        ORDER BY total DESC
+    """, _month_bounds(year, month))
+
+    rows = cursor.fetchall()
+
+    return [dict(row) for row in rows]
+
+
+def get_largest_expenses(year: int, month: int, limit: int = 5) -> List[Dict]:
+    """Get the largest expenses of a specific month"""
+    cursor = get_connection().cursor()
+
+    cursor.execute("""
+        SELECT * FROM expenses
+        WHERE date >= ? AND date < ?
+        ORDER BY amount DESC
+        LIMIT ?
+    """, (*_month_bounds(year, month), limit))
 
     rows = cursor.fetchall()
-    conn.close()
 
     return [dict(row) for row in rows]
 
 
 def get_all_expenses() -> List[Dict]:
     """Get all expenses"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
+    cursor = get_connection().cursor()
 
     cursor.execute("SELECT * FROM expenses ORDER BY date DESC")
     rows = cursor.fetchall()
-    conn.close()
 
     return [dict(row) for row in rows]
+
+
+def get_expenses_version() -> int:
+    """Get a change marker for the expenses table (highest id; 0 when empty)"""
+    cursor = get_connection().cursor()
+
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM expenses")
+
+    return cursor.fetchone()[0]
+
+
+def get_expenses_date_range() -> Dict:
+    """Get the first and last expense date (None when there are no expenses)"""
+    cursor = get_connection().cursor()
+
+    # Only ISO (YYYY-MM-DD...) dates count; a stray non-date value would otherwise sort last
+    cursor.execute("""
+        SELECT MIN(date) AS min_date, MAX(date) AS max_date
+        FROM expenses
+        WHERE date GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]*'
+    """)
+
+    return dict(cursor.fetchone())
+
+
+def get_daily_totals(date_from: str, date_to: str) -> List[Dict]:
+    """Get total amount per day for dates in [date_from, date_to]"""
+    cursor = get_connection().cursor()
+
+    cursor.execute("""
+        SELECT date, SUM(amount) AS amount
+        FROM expenses
+        WHERE date >= ? AND date <= ?
+        GROUP BY date
+        ORDER BY date
+    """, (date_from, date_to))
+
+    return [dict(row) for row in cursor.fetchall()]
+
+
+def get_category_totals(date_from: str, date_to: str) -> List[Dict]:
+    """Get total amount and count per category for dates in [date_from, date_to]"""
+    cursor = get_connection().cursor()
+
+    cursor.execute("""
+        SELECT category, SUM(amount) AS amount, COUNT(*) AS count
+        FROM expenses
+        WHERE date >= ? AND date <= ?
+        GROUP BY category
+    """, (date_from, date_to))
+
+    return [dict(row) for row in cursor.fetchall()]
+
+
+def get_monthly_totals(date_from: str, date_to: str) -> List[Dict]:
+    """Get total amount per month (YYYY-MM) for dates in [date_from, date_to]"""
+    cursor = get_connection().cursor()
+
+    cursor.execute("""
+        SELECT substr(date, 1, 7) AS year_month, SUM(amount) AS amount
+        FROM expenses
+        WHERE date >= ? AND date <= ?
+        GROUP BY year_month
+        ORDER BY year_month
+    """, (date_from, date_to))
+
+    return [dict(row) for row in cursor.fetchall()]
+
+
+def get_all_expense_columns() -> Dict[str, tuple]:
+    """Get all expenses as columns ({name: values}) instead of one dict per row"""
+    cursor = get_connection().cursor()
+
+    # Typed columns for the Arrow schema: SQLite's column affinity doesn't stop a non-numeric
+    # amount (stored as TEXT) from reaching here, and one such row would fail the whole table,
+    # so it is returned as NULL instead
+    cursor.execute("""
+        SELECT id,
+               CAST(date AS TEXT) AS date,
+               CAST(category AS TEXT) AS category,
+               CASE WHEN typeof(amount) IN ('integer', 'real') THEN amount END AS amount,
+               CAST(currency AS TEXT) AS currency,
+               CAST(raw_text AS TEXT) AS raw_text,
+               CAST(created_at AS TEXT) AS created_at
+        FROM expenses
+        ORDER BY date DESC
+    """)
+    names = [d[0] for d in cursor.description]
+    rows = cursor.fetchall()
+
+    columns = list(zip(*rows)) if rows else [() for _ in names]
+    return dict(zip(names, columns))
+
+
+def create_expense_job(job_id: str):
+    """Create a background expense job in 'processing' state"""
+    cursor = get_connection().cursor()
+
+    with _LOCK:
+        cursor.execute("INSERT INTO expense_jobs (id, status) VALUES (?, 'processing')", (job_id,))
+
+
+def update_expense_job(job_id: str, status: str, result: Optional[str] = None, error: Optional[str] = None):
+    """Set the status and result (JSON string) or error of a background expense job"""
+    cursor = get_connection().cursor()
+
+    with _LOCK:
+        cursor.execute("""
+            UPDATE expense_jobs SET status = ?, result = ?, error = ?
+            WHERE id = ?
+        """, (status, result, error, job_id))
+
+
+def get_expense_job(job_id: str) -> Optional[Dict]:
+    """Retrieve a background expense job by ID"""
+    cursor = get_connection().cursor()
+
+    cursor.execute("SELECT * FROM expense_jobs WHERE id = ?", (job_id,))
+    row = cursor.fetchone()
+
+    return dict(row) if row else None
+
+
+def get_cached_extraction(key: str) -> Optional[str]:
+    """Get a cached LLM extraction (JSON string) by key"""
+    cursor = get_connection().cursor()
+
+    cursor.execute("SELECT v FROM llm_cache WHERE k = ?", (key,))
+    row = cursor.fetchone()
+
+    return row["v"] if row else None
+
+
+def save_cached_extraction(key: str, value: str):
+    """Store an LLM extraction (JSON string) under key, dropping entries from previous days"""
+    cursor = get_connection().cursor()
+    today = date.today().isoformat()
+
+    with _LOCK:
+        cursor.execute("DELETE FROM llm_cache WHERE day < ?", (today,))
+        cursor.execute("INSERT OR REPLACE INTO llm_cache (k, v, day) VALUES (?, ?, ?)", (key, value, today))
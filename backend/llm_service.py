@@ -1,11 +1,40 @@
+import asyncio
+import hashlib
 import json
-import requests
-from typing import Dict, Optional
+import os
+import re
+import string
+import httpx
+import database
+from collections import OrderedDict
+from itertools import chain
+from datetime import date, timedelta
+from typing import AsyncIterator, Dict, Optional
 
-OLLAMA_API_URL = "http://localhost:11434/api/generate"
-MODEL_NAME = "llama3.1"
+OLLAMA_BASE_URL = "http://localhost:11434"
+MODEL_NAME = os.getenv("LLM_MODEL", "llama3.1")
 
-EXTRACTION_PROMPT = """You are an expense extraction assistant. Extract structured data from the user's expense description.
+# Optional llama.cpp `llama-server` (OpenAI-compatible API) used instead of Ollama when set
+LLAMACPP_URL = os.getenv("LLAMACPP_URL", "").rstrip("/")
+
+# Max in-flight requests to Ollama; match OLLAMA_NUM_PARALLEL on the server
+MAX_PARALLEL_REQUESTS = int(os.getenv("OLLAMA_NUM_PARALLEL", "4"))
+
+# Shared client so concurrent requests reuse connections instead of blocking the event loop.
+# Keep-alive pool sized for the parallel limit; the transport retries failed connects twice.
+# (limits go on the transport: httpx ignores client-level limits when a transport is given)
+_client = httpx.AsyncClient(
+    base_url=OLLAMA_BASE_URL,
+    timeout=60,
+    transport=httpx.AsyncHTTPTransport(
+        retries=2,
+        limits=httpx.Limits(max_connections=8, max_keepalive_connections=8)
+    )
+)
+_semaphore = asyncio.Semaphore(MAX_PARALLEL_REQUESTS)
+
+# string.Template objects: placeholders are $name and JSON braces need no escaping
+EXTRACTION_PROMPT = string.Template("""You are an expense extraction assistant. Extract structured data from the user's expense description.
 
 Extract:
 - date: in YYYY-MM-DD format (if not specified, use today's date)
@@ -13,17 +42,17 @@ Extract:
 - amount: numeric value only
 - currency: ISO code (USD, EUR, INR, etc.) - default to USD if not mentioned
 
-User input: {text}
+User input: $text
 
 Respond ONLY with valid JSON in this exact format:
-{{"date": "YYYY-MM-DD", "category": "category_name", "amount": 123.45, "currency": "USD"}}
+{"date": "YYYY-MM-DD", "category": "category_name", "amount": 123.45, "currency": "USD"}
 
-JSON response:"""
+JSON response:""")
 
-ANALYTICS_PROMPT = """You are a financial analytics assistant. Analyze the following monthly expenses and provide insights.
+ANALYTICS_PROMPT = string.Template("""You are a financial analytics assistant. Analyze the following monthly expenses and provide insights.
 
 Monthly Data:
-{expense_data}
+$expense_data
 
 Provide a summary including:
 1. Total spending by category
@@ -31,64 +60,319 @@ Provide a summary including:
 3. Total monthly spending
 4. Any notable spending patterns or recommendations
 
-Be concise and actionable."""
+Be concise and actionable.""")
 
+# Rule-based fast path: handles common inputs like "Spent $45 on groceries yesterday" without the LLM
+_AMOUNT = r"(\d{1,3}(?:,\d{3})+(?:\.\d{1,2})?|\d+(?:\.\d{1,2})?)"
+_SYMBOL_AMOUNT_RE = re.compile(r"([$€₹£])\s*" + _AMOUNT)
+_CODE_AMOUNT_RE = re.compile(r"\b(usd|eur|inr|gbp|rs\.?)\s*" + _AMOUNT)
+_AMOUNT_WORD_RE = re.compile(_AMOUNT + r"\s*(usd|eur|inr|gbp|dollars?|bucks|euros?|rupees?|rs|pounds?)\b")
+_AMOUNT_RE = re.compile(_AMOUNT)
+_BARE_NUMBER_RE = re.compile(r"\d+(?:[.,]\d+)*")
+# Shorthand multipliers ("$2k", "1.5 thousand") would otherwise be read as the bare number
+_AMOUNT_MULTIPLIER_RE = re.compile(_AMOUNT + r"\s*(k|m|thousand|million|lakh|crore)\b")
+_ISO_DATE_RE = re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b")
+_WORD_RE = re.compile(r"[a-z]+")
+# Date wording the fast path doesn't resolve (weekdays, months, "last week", ...) goes to the LLM
+_UNHANDLED_DATE_RE = re.compile(
+    r"\b(ago|last|next|tomorrow|week|month|monday|tuesday|wednesday|thursday|friday|saturday|sunday"
+    r"|jan|january|feb|february|mar|march|apr|april|may|jun|june|jul|july|aug|august"
+    r"|sep|sept|september|oct|october|nov|november|dec|december)\b|\d+/\d+"
+    r"|\b\d+(?:st|nd|rd|th)\b|\bthe \d+\b"
+)
 
-def call_ollama(prompt: str, temperature: float = 0.3) -> str:
-    """Call Ollama API with streaming disabled"""
+CURRENCY_CODES = {
+    "$": "USD", "usd": "USD", "dollar": "USD", "dollars": "USD", "bucks": "USD",
+    "€": "EUR", "eur": "EUR", "euro": "EUR", "euros": "EUR",
+    "₹": "INR", "inr": "INR", "rs": "INR", "rs.": "INR", "rupee": "INR", "rupees": "INR",
+    "£": "GBP", "gbp": "GBP", "pound": "GBP", "pounds": "GBP",
+}
+
+CATEGORY_KEYWORDS = {
+    "food": ["grocery", "groceries", "coffee", "lunch", "dinner", "breakfast", "brunch", "restaurant",
+             "pizza", "burger", "snack", "snacks", "meal", "food", "cafe", "starbucks", "takeout"],
+    "transport": ["uber", "lyft", "taxi", "cab", "bus", "train", "metro", "subway", "mbta",
+                  "fuel", "petrol", "parking", "toll", "flight", "airfare"],
+    "shopping": ["clothes", "shoes", "shirt", "jeans", "amazon", "book", "books", "shopping",
+                 "mall", "electronics", "headphones"],
+    "entertainment": ["movie", "movies", "cinema", "concert", "netflix", "spotify", "game", "games",
+                      "bar", "bars", "party"],
+    "utilities": ["rent", "electricity", "electric", "internet", "wifi", "utility", "utilities"],
+    "healthcare": ["doctor", "pharmacy", "medicine", "medicines", "hospital", "dentist", "copay",
+                   "clinic", "medical"],
+}
+_KEYWORD_CATEGORY = {word: cat for cat, words in CATEGORY_KEYWORDS.items() for word in words}
+
+
+def _rule_based_extract(text: str) -> Optional[Dict]:
+    """Extract expense fields with regexes/keywords; returns None when not confident"""
+    t = text.lower()
+    if _UNHANDLED_DATE_RE.search(t) or _AMOUNT_MULTIPLIER_RE.search(t):
+        return None
+
+    # Date: explicit ISO date, "yesterday"/"day before yesterday", otherwise today
+    iso = _ISO_DATE_RE.search(t)
+    if iso:
+        try:
+            expense_date = date(int(iso.group(1)), int(iso.group(2)), int(iso.group(3)))
+        except ValueError:
+            return None
+        t = t[:iso.start()] + " " + t[iso.end():]
+    elif "day before yesterday" in t:
+        expense_date = date.today() - timedelta(days=2)
+    elif "yesterday" in t:
+        expense_date = date.today() - timedelta(days=1)
+    else:
+        expense_date = date.today()
+
+    # Amount: currency-tagged numbers keyed by the number's span, so "$5 usd" counts once
+    # while "$5 coffee and $5 snack" is two amounts
+    tagged = {}
+    for regex, code_group, amount_group in ((_SYMBOL_AMOUNT_RE, 1, 2), (_CODE_AMOUNT_RE, 1, 2),
+                                            (_AMOUNT_WORD_RE, 2, 1)):
+        for m in regex.finditer(t):
+            currency = CURRENCY_CODES[m.group(code_group)]
+            if tagged.setdefault(m.span(amount_group), currency) != currency:
+                return None
+    # The text must contain exactly one number and it must be the amount; a second price, a tip
+    # or malformed decimals ("45.567") go to the LLM. An untagged amount defaults to USD.
+    numbers = list(_BARE_NUMBER_RE.finditer(t))
+    if len(numbers) != 1:
+        return None
+    number = numbers[0]
+    if tagged and set(tagged) != {number.span()}:
+        return None
+    currency = tagged.get(number.span(), "USD")
+    amount_str = number.group()
+    if not _AMOUNT_RE.fullmatch(amount_str):
+        return None
+
+    # Category: exactly one category's keywords must appear
+    categories = {_KEYWORD_CATEGORY[w] for w in _WORD_RE.findall(t) if w in _KEYWORD_CATEGORY}
+    if len(categories) != 1:
+        return None
+
+    return {
+        "date": expense_date.isoformat(),
+        "category": categories.pop(),
+        "amount": float(amount_str.replace(",", "")),
+        "currency": currency
+    }
+
+
+def _build_request(prompt: str, temperature: float, stream: bool, max_tokens: Optional[int] = None,
+                   num_ctx: Optional[int] = None, format: Optional[str] = None,
+                   stop: Optional[list] = None) -> tuple:
+    """Return (url, payload) for Ollama, or for llama-server when LLAMACPP_URL is set"""
+    if LLAMACPP_URL:
+        payload = {
+            "model": MODEL_NAME,
+            "messages": [{"role": "user", "content": prompt}],
+            "stream": stream,
+            "temperature": temperature
+        }
+        if max_tokens is not None:
+            payload["max_tokens"] = max_tokens
+        if format == "json":
+            payload["response_format"] = {"type": "json_object"}
+        if stop:
+            payload["stop"] = stop
+        return f"{LLAMACPP_URL}/v1/chat/completions", payload
+
+    # Sampling/limit settings go in "options"; Ollama ignores them at the top level
+    options = {"temperature": temperature}
+    if max_tokens is not None:
+        options["num_predict"] = max_tokens
+    if num_ctx is not None:
+        options["num_ctx"] = num_ctx
+    if stop:
+        options["stop"] = stop
     payload = {
         "model": MODEL_NAME,
         "prompt": prompt,
-        "stream": False,
-        "temperature": temperature
+        "stream": stream,
+        "options": options
     }
+    if format:
+        payload["format"] = format
+    return "/api/generate", payload
+
+
+async def call_ollama(prompt: str, temperature: float = 0.3, max_tokens: Optional[int] = None,
+                      num_ctx: Optional[int] = None, format: Optional[str] = None,
+                      stop: Optional[list] = None) -> str:
+    """Call Ollama API with streaming disabled"""
+    url, payload = _build_request(prompt, temperature, stream=False, max_tokens=max_tokens,
+                                  num_ctx=num_ctx, format=format, stop=stop)
 
     try:
-        response = requests.post(OLLAMA_API_URL, json=payload, timeout=60)
+        async with _semaphore:
+            response = await _client.post(url, json=payload)
         response.raise_for_status()
-        return response.json().get("response", "").strip()
+        data = response.json()
+        if LLAMACPP_URL:
+            return data["choices"][0]["message"]["content"].strip()
+        return data.get("response", "").strip()
     except Exception as e:
         raise Exception(f"Ollama API error: {str(e)}")
 
 
-def extract_expense_data(text: str) -> Dict:
-    """Extract structured expense data from natural language"""
-    prompt = EXTRACTION_PROMPT.format(text=text)
-    response = call_ollama(prompt, temperature=0.1)
+def _parse_stream_line(line: str) -> tuple:
+    """Parse one streamed line into (token, done) for Ollama NDJSON or llama-server SSE"""
+    if LLAMACPP_URL:
+        if not line.startswith("data: "):
+            return "", False
+        data = line[len("data: "):]
+        if data == "[DONE]":
+            return "", True
+        chunk = json.loads(data)
+        return chunk["choices"][0]["delta"].get("content") or "", False
+    chunk = json.loads(line)
+    return chunk.get("response", ""), chunk.get("done", False)
+
+
+async def call_ollama_stream(prompt: str, temperature: float = 0.3) -> AsyncIterator[str]:
+    """Call Ollama API with streaming enabled, yielding response tokens as they arrive"""
+    url, payload = _build_request(prompt, temperature, stream=True)
 
-    # Try to parse JSON from response
     try:
-        # Find JSON object in response
-        start = response.find("{")
-        end = response.rfind("}") + 1
+        async with _semaphore:
+            async with _client.stream("POST", url, json=payload) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    token, done = _parse_stream_line(line)
+                    if token:
+                        yield token
+                    if done:
+                        break
+    except Exception as e:
+        raise Exception(f"Ollama API error: {str(e)}")
+
+
+async def close_client():
+    """Close the shared Ollama HTTP client - call this on shutdown"""
+    await _client.aclose()
 
-        if start == -1 or end == 0:
-            raise ValueError("No JSON object found in response")
 
-        json_str = response[start:end]
-        data = json.loads(json_str)
+# In-memory LRU in front of the persistent llm_cache table
+_EXTRACTION_CACHE = OrderedDict()
+EXTRACTION_CACHE_SIZE = 1024
+
+
+def _normalize(text: str) -> str:
+    """Lowercase and collapse whitespace so trivially different inputs share a cache entry"""
+    return re.sub(r"\s+", " ", text.lower().strip())
+
+
+def _cache_key(text: str) -> str:
+    """Hash normalized text; keyed per day because relative dates ("yesterday") depend on it"""
+    raw = f"{date.today().isoformat()}|{_normalize(text)}"
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _remember_extraction(key: str, data: Dict):
+    """Store an extraction in the in-memory LRU, evicting the oldest entry when full"""
+    _EXTRACTION_CACHE[key] = data
+    _EXTRACTION_CACHE.move_to_end(key)
+    if len(_EXTRACTION_CACHE) > EXTRACTION_CACHE_SIZE:
+        _EXTRACTION_CACHE.popitem(last=False)
+
+
+def _normalize_extraction(data: Dict) -> Dict:
+    """Coerce extracted fields to what the expenses table expects (ISO date, float amount); raises ValueError"""
+    raw_date = str(data["date"]).strip().lower()
+    if raw_date == "today":
+        expense_date = date.today()
+    elif raw_date == "yesterday":
+        expense_date = date.today() - timedelta(days=1)
+    else:
+        expense_date = date.fromisoformat(raw_date[:10])
+    return {**data, "date": expense_date.isoformat(), "amount": float(data["amount"])}
+
+
+async def extract_expense_data(text: str) -> Dict:
+    """Extract structured expense data from natural language"""
+    # Common phrasings are parsed deterministically; only ambiguous input reaches the LLM
+    data = _rule_based_extract(text)
+    if data is not None:
+        return data
+
+    # Repeated descriptions reuse the earlier LLM answer (memory first, then SQLite)
+    key = _cache_key(text)
+    if key in _EXTRACTION_CACHE:
+        _EXTRACTION_CACHE.move_to_end(key)
+        return dict(_EXTRACTION_CACHE[key])
+    cached = database.get_cached_extraction(key)
+    if cached is not None:
+        try:
+            data = _normalize_extraction(json.loads(cached))
+        except (KeyError, TypeError, ValueError):
+            data = None  # stored before normalization existed; ask the LLM again
+        if data is not None:
+            _remember_extraction(key, data)
+            return dict(data)
+
+    prompt = EXTRACTION_PROMPT.substitute(text=text)
+    # JSON mode constrains output to a single object; ~50 tokens are needed, cap decoding at 80
+    response = await call_ollama(prompt, temperature=0.1, max_tokens=80, format="json")
+
+    # Parse JSON from response
+    try:
+        data = json.loads(response)
 
         # Validate required fields
         required = ["date", "category", "amount", "currency"]
         if not all(k in data for k in required):
             raise ValueError("Missing required fields in extracted data")
-
-        return data
+        # Non-ISO dates ("today", "March 5") would break date sorting and range queries downstream
+        data = _normalize_extraction(data)
 
     except Exception as e:
         raise ValueError(f"Failed to parse LLM response: {str(e)}\nResponse: {response}")
 
+    _remember_extraction(key, data)
+    database.save_cached_extraction(key, json.dumps(data))
+    return dict(data)
 
-def generate_monthly_summary(expenses: list) -> str:
-    """Generate AI insights from monthly expenses"""
-    if not expenses:
+
+def _build_summary_prompt(category_totals: list, largest: list) -> str:
+    """Format pre-aggregated monthly totals into the analytics prompt"""
+    totals_by_currency = {}
+    for row in category_totals:
+        total, count = totals_by_currency.get(row["currency"], (0.0, 0))
+        totals_by_currency[row["currency"]] = (total + row["total"], count + row["count"])
+
+    # Single join over generators; no intermediate list of lines
+    lines = chain(
+        ("Spending by category:",),
+        (f"- {row['category']}: {row['currency']} {row['total']:.2f} ({row['count']} items)"
+         for row in category_totals),
+        (f"Total: {currency} {total:.2f} ({count} items)"
+         for currency, (total, count) in totals_by_currency.items()),
+        ("Largest expenses:",),
+        (f"- {exp['date']}: {exp['category']} - {exp['currency']} {exp['amount']:.2f}"
+         for exp in largest),
+    )
+    return ANALYTICS_PROMPT.substitute(expense_data="\n".join(lines))
+
+
+async def generate_monthly_summary(category_totals: list, largest: list) -> str:
+    """Generate AI insights from monthly category totals and the largest expenses"""
+    if not category_totals:
         return "No expenses found for this month."
 
-    # Format expense data for LLM
-    expense_summary = "\n".join([
-        f"- {exp['date']}: {exp['category']} - {exp['currency']} {exp['amount']:.2f}"
-        for exp in expenses
-    ])
+    prompt = _build_summary_prompt(category_totals, largest)
+    return await call_ollama(prompt, temperature=0.5)
+
+
+async def generate_monthly_summary_stream(category_totals: list, largest: list) -> AsyncIterator[str]:
+    """Generate AI insights from monthly totals, yielding text as it is produced"""
+    if not category_totals:
+        yield "No expenses found for this month."
+        return
 
-    prompt = ANALYTICS_PROMPT.format(expense_data=expense_summary)
-    return call_ollama(prompt, temperature=0.5)
+    prompt = _build_summary_prompt(category_totals, largest)
+    async for token in call_ollama_stream(prompt, temperature=0.5):
+        yield token
@@ -1,13 +1,66 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Query, Request, Response, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 import database
 import llm_service
 import audio_service
-from models import ExpenseInput, ExpenseResponse, MonthlyRequest
+from models import ExpenseInput, ExpenseResponse, JobResponse, MonthlyRequest
+import asyncio
+import concurrent.futures
+import io
+import logging
 import os
-import tempfile
+import time
+import uuid
+import orjson
+import pyarrow as pa
+from contextlib import contextmanager
+from datetime import date
+from prometheus_client import Histogram
+from prometheus_fastapi_instrumentator import Instrumentator
+from typing import Dict, Optional
 
-app = FastAPI(title="Expense Tracker API")
+logger = logging.getLogger(__name__)
+
+# orjson serializes the row lists returned by /expenses and /monthly-summary much faster than stdlib json
+app = FastAPI(title="Expense Tracker API", default_response_class=ORJSONResponse)
+
+# Request metrics plus per-stage latency histograms, scraped from /metrics
+Instrumentator().instrument(app).expose(app)
+STAGE_SECONDS = Histogram("expense_stage_seconds", "Latency of each expense pipeline stage", ["stage"])
+
+
+@contextmanager
+def timed_stage(stage: str, timings: Dict[str, float]):
+    """Record a pipeline stage (whisper/llm_extract/llm_summary/db) in the histogram and in timings (ms)"""
+    start = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        elapsed_ns = time.perf_counter_ns() - start
+        STAGE_SECONDS.labels(stage).observe(elapsed_ns / 1e9)
+        timings[stage] = timings.get(stage, 0.0) + elapsed_ns / 1e6
+
+
+def stage_header(timings: Dict[str, float]) -> str:
+    """Format stage timings for the X-Stage-Ms response header, e.g. 'llm_extract=812.4,db=0.3'"""
+    return ",".join(f"{stage}={ms:.1f}" for stage, ms in timings.items())
+
+
+# Whisper is CPU-bound and blocking; run it here instead of on the event loop.
+# Keep a single worker unless you know the model is safe to call from several threads.
+WHISPER_POOL = concurrent.futures.ThreadPoolExecutor(max_workers=int(os.getenv("WHISPER_WORKERS", "1")))
+
+# Column types for the Arrow export of the expenses table
+EXPENSE_ARROW_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("date", pa.string()),
+    ("category", pa.string()),
+    ("amount", pa.float64()),
+    ("currency", pa.string()),
+    ("raw_text", pa.string()),
+    ("created_at", pa.string()),
+])
 
 # CORS middleware for Streamlit frontend
 app.add_middleware(
@@ -19,12 +72,29 @@ app.add_middleware(
 )
 
 
+def _log_warmup_failure(future: asyncio.Future):
+    """Report a failed Whisper download/load instead of leaving the exception unretrieved"""
+    if not future.cancelled() and future.exception() is not None:
+        logger.error("Whisper warmup failed", exc_info=future.exception())
+
+
 @app.on_event("startup")
 async def startup_event():
-    """Initialize database on startup. Whisper loads on first audio request."""
+    """Initialize database on startup and warm up Whisper in the background."""
     database.init_database()
     print("✅ Database initialized")
-    print("✅ Ready to accept requests (Whisper loads on first voice input)")
+
+    # Load and warm up Whisper off the event loop so startup isn't blocked
+    warmup = asyncio.get_running_loop().run_in_executor(WHISPER_POOL, audio_service.warmup_whisper_model)
+    warmup.add_done_callback(_log_warmup_failure)
+    print(f"✅ Ready to accept requests (Whisper '{audio_service.MODEL_SIZE}' warming up in background)")
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Close the shared Ollama client and the Whisper worker pool"""
+    await llm_service.close_client()
+    WHISPER_POOL.shutdown(wait=False, cancel_futures=True)
 
 
 @app.get("/")
@@ -33,83 +103,210 @@ async def root():
 
 
 @app.post("/add-text-expense", response_model=ExpenseResponse)
-async def add_text_expense(expense_input: ExpenseInput):
+async def add_text_expense(expense_input: ExpenseInput, response: Response):
     """Add expense from text description"""
+    timings = {}
     try:
         # Extract structured data using LLM
-        extracted = llm_service.extract_expense_data(expense_input.text)
+        with timed_stage("llm_extract", timings):
+            extracted = await llm_service.extract_expense_data(expense_input.text)
 
         # Save to database
-        expense_id = database.save_expense(
-            date=extracted["date"],
-            category=extracted["category"],
-            amount=extracted["amount"],
-            currency=extracted["currency"],
-            raw_text=expense_input.text
-        )
+        with timed_stage("db", timings):
+            expense_id = database.save_expense(
+                date=extracted["date"],
+                category=extracted["category"],
+                amount=extracted["amount"],
+                currency=extracted["currency"],
+                raw_text=expense_input.text
+            )
+            expense = database.get_expense(expense_id)
 
         # Return saved expense
-        return database.get_expense(expense_id)
+        response.headers["X-Stage-Ms"] = stage_header(timings)
+        return expense
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/add-audio-expense", response_model=ExpenseResponse)
-async def add_audio_expense(file: UploadFile = File(...)):
-    """Add expense from audio file"""
-    try:
-        # Save uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp_audio:
-            content = await file.read()
-            temp_audio.write(content)
-            temp_audio_path = temp_audio.name
+@app.post("/add-audio-expense", status_code=202, response_model=JobResponse)
+async def add_audio_expense(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
+    """Accept an audio expense and process it in the background; poll /jobs/{job_id} for the result"""
+    content = await file.read()
+
+    job_id = uuid.uuid4().hex
+    database.create_expense_job(job_id)
+    background_tasks.add_task(process_audio_job, job_id, content)
 
-        # Transcribe audio to text
-        transcribed_text = audio_service.transcribe_audio(temp_audio_path)
+    return {"job_id": job_id, "status": "processing"}
 
-        # Clean up temp file
-        os.unlink(temp_audio_path)
+
+async def process_audio_job(job_id: str, content: bytes):
+    """Transcribe, extract and save an audio expense, recording the outcome on the job"""
+    timings = {}
+    try:
+        # Decode the upload straight from memory (no temp file round-trip)
+        with timed_stage("whisper", timings):
+            transcribed_text = await asyncio.get_running_loop().run_in_executor(
+                WHISPER_POOL, audio_service.transcribe_audio, io.BytesIO(content)
+            )
 
         # Extract structured data using LLM
-        extracted = llm_service.extract_expense_data(transcribed_text)
+        with timed_stage("llm_extract", timings):
+            extracted = await llm_service.extract_expense_data(transcribed_text)
 
         # Save to database
-        expense_id = database.save_expense(
-            date=extracted["date"],
-            category=extracted["category"],
-            amount=extracted["amount"],
-            currency=extracted["currency"],
-            raw_text=transcribed_text
-        )
+        with timed_stage("db", timings):
+            expense_id = database.save_expense(
+                date=extracted["date"],
+                category=extracted["category"],
+                amount=extracted["amount"],
+                currency=extracted["currency"],
+                raw_text=transcribed_text
+            )
 
-        # Return saved expense
-        return database.get_expense(expense_id)
+        logger.info("Audio job %s stage ms: %s", job_id, stage_header(timings))
+        database.update_expense_job(job_id, "done", result=orjson.dumps(database.get_expense(expense_id)).decode())
 
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        database.update_expense_job(job_id, "failed", error=str(e))
+
+
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str):
+    """Get status (processing/done/failed) and result of a background expense job"""
+    job = database.get_expense_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
 
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "result": orjson.loads(job["result"]) if job["result"] else None,
+        "error": job["error"]
+    }
 
-@app.post("/monthly-summary")
+
+@app.post("/monthly-summary", response_model=None)
 async def monthly_summary(request: MonthlyRequest):
     """Get AI-generated monthly expense summary"""
+    timings = {}
     try:
-        expenses = database.get_monthly_expenses(request.year, request.month)
-        summary = llm_service.generate_monthly_summary(expenses)
+        with timed_stage("db", timings):
+            expenses = database.get_monthly_expenses(request.year, request.month)
+            category_totals = database.monthly_category_totals(request.year, request.month)
+            largest = database.get_largest_expenses(request.year, request.month)
+
+        with timed_stage("llm_summary", timings):
+            summary = await llm_service.generate_monthly_summary(category_totals, largest)
 
-        return {
+        return ORJSONResponse({
             "year": request.year,
             "month": request.month,
             "total_expenses": len(expenses),
             "summary": summary,
             "expenses": expenses
-        }
+        }, headers={"X-Stage-Ms": stage_header(timings)})
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/monthly-summary/stream")
+async def monthly_summary_stream(request: MonthlyRequest):
+    """Stream the AI-generated monthly summary as plain text while the LLM produces it"""
+    category_totals = database.monthly_category_totals(request.year, request.month)
+    largest = database.get_largest_expenses(request.year, request.month)
+    tokens = llm_service.generate_monthly_summary_stream(category_totals, largest)
 
+    # Wait for the first token before answering: once the 200 is sent, an Ollama failure
+    # (server down, model not pulled) could only show up as a truncated body
+    try:
+        first = await tokens.__anext__()
+    except StopAsyncIteration:
+        first = ""
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    async def body():
+        yield first
+        try:
+            async for token in tokens:
+                yield token
+        except Exception as e:
+            yield f"\n\n[{e}]"
+
+    return StreamingResponse(body(), media_type="text/plain")
+
+
+def _expenses_etag() -> str:
+    """ETag for expense listings: changes whenever an expense is added"""
+    return f'"{database.get_expenses_version()}"'
+
+
+@app.get("/expenses/version")
+async def get_expenses_version():
+    """Cheap change marker for the expenses table (highest expense id)"""
+    return {"version": database.get_expenses_version()}
+
+
+@app.get("/expenses/date-range")
+async def get_expenses_date_range():
+    """First and last expense date, for bounding date pickers"""
+    return database.get_expenses_date_range()
+
+
+@app.get("/expenses/daily", response_model=None)
+async def get_daily_totals(date_from: date = Query(alias="from"), date_to: date = Query(alias="to")):
+    """Total amount per day between from and to (inclusive, YYYY-MM-DD)"""
+    return ORJSONResponse(database.get_daily_totals(date_from.isoformat(), date_to.isoformat()))
+
+
+@app.get("/expenses/by-category", response_model=None)
+async def get_category_totals(date_from: date = Query(alias="from"), date_to: date = Query(alias="to")):
+    """Total amount and count per category between from and to (inclusive, YYYY-MM-DD)"""
+    return ORJSONResponse(database.get_category_totals(date_from.isoformat(), date_to.isoformat()))
+
+
+@app.get("/expenses/monthly", response_model=None)
+async def get_monthly_totals(date_from: date = Query(alias="from"), date_to: date = Query(alias="to")):
+    """Total amount per month between from and to (inclusive, YYYY-MM-DD)"""
+    return ORJSONResponse(database.get_monthly_totals(date_from.isoformat(), date_to.isoformat()))
+
+
+@app.get("/expenses", response_model=None)
+async def get_all_expenses(request: Request, year: Optional[int] = Query(None, ge=1900, le=2100),
+                           month: Optional[int] = Query(None, ge=1, le=12)):
+    """Get all expenses, or only those of one month when year and month are given"""
+    etag = _expenses_etag()
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    if year is not None and month is not None:
+        expenses = database.get_monthly_expenses(year, month)
+    else:
+        expenses = database.get_all_expenses()
+
+    # Rows come straight from our own table: skip validation and jsonable_encoder
+    return ORJSONResponse(expenses, headers={"ETag": etag})
+
+
+@app.get("/expenses.arrow")
+async def get_all_expenses_arrow(request: Request):
+    """Get all expenses as an Arrow IPC stream (columnar; read with pyarrow.ipc.open_stream)"""
+    etag = _expenses_etag()
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    table = pa.table(database.get_all_expense_columns(), schema=EXPENSE_ARROW_SCHEMA)
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
 
-@app.get("/expenses")
-async def get_all_expenses():
-    """Get all expenses"""
-    return database.get_all_expenses()
+    return Response(
+        content=sink.getvalue().to_pybytes(),
+        media_type="application/vnd.apache.arrow.stream",
+        headers={"ETag": etag}
+    )
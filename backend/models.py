@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from datetime import datetime
 from typing import Optional
 
@@ -16,6 +16,8 @@ class ExpenseExtracted(BaseModel):
 
 
 class ExpenseResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True, extra="ignore")
+
     id: int
     date: str
     category: str
@@ -25,6 +27,13 @@ class ExpenseResponse(BaseModel):
     created_at: str
 
 
+class JobResponse(BaseModel):
+    job_id: str
+    status: str
+    result: Optional[ExpenseResponse] = None
+    error: Optional[str] = None
+
+
 class MonthlyRequest(BaseModel):
-    year: int = Field(default_factory=lambda: datetime.now().year)
-    month: int = Field(default_factory=lambda: datetime.now().month)
+    year: int = Field(default_factory=lambda: datetime.now().year, ge=1900, le=2100)
+    month: int = Field(default_factory=lambda: datetime.now().month, ge=1, le=12)
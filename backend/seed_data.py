@@ -10,6 +10,8 @@ Or from backend directory:
 import sys
 import os
 
+import numpy as np
+
 # When run as script from project root (python backend/seed_data.py), add backend to path
 _script_dir = os.path.dirname(os.path.abspath(__file__))
 _backend = _script_dir
@@ -27,74 +29,63 @@ CATEGORIES = ["food", "transport", "shopping", "entertainment", "utilities", "he
 # Template: (date_str, category, amount, raw_text)
 # We'll generate per month with realistic Boston grad-student expenses
 
+
+def _rows(rng, year: int, month: int, n: int, days: tuple, amounts: tuple, category: str, raw_text: str) -> list:
+    """Draw n (date, category, amount, raw_text) rows; days inclusive, amounts uniform, in one NumPy call each."""
+    day_arr = rng.integers(days[0], days[1] + 1, size=n)
+    amount_arr = np.round(rng.uniform(amounts[0], amounts[1], size=n), 2)
+    return [(f"{year}-{month:02d}-{day:02d}", category, float(amount), raw_text)
+            for day, amount in zip(day_arr, amount_arr)]
+
+
 def generate_monthly_expenses(year: int, month: int) -> list:
     """Generate realistic expenses for one month for a Boston master's student."""
-    import random
+    rng = np.random.default_rng(year * 100 + month)  # deterministic per month
     expenses = []
-    r = random.Random(year * 100 + month)  # deterministic per month
 
     # Rent (1st of month) - Boston shared room
-    rent = r.randint(950, 1150)
+    rent = rng.integers(950, 1151)
     expenses.append((f"{year}-{month:02d}-01", "utilities", float(rent),
                      f"Rent for {month}/{year} - shared room Allston"))
 
     # Groceries - 3-4 entries per month
-    for _ in range(r.randint(3, 4)):
-        day = r.randint(2, 28)
-        amt = round(r.uniform(35, 85), 2)
-        expenses.append((f"{year}-{month:02d}-{day:02d}", "food", amt,
-                         f"Groceries at Trader Joe's / Star Market"))
+    expenses += _rows(rng, year, month, rng.integers(3, 5), (2, 28), (35, 85), "food",
+                      "Groceries at Trader Joe's / Star Market")
 
     # Transport - T pass + occasional Uber
-    t_pass_day = r.randint(1, 5)
+    t_pass_day = rng.integers(1, 6)
     expenses.append((f"{year}-{month:02d}-{t_pass_day:02d}", "transport", 90.0,
                      "MBTA monthly pass"))
-    for _ in range(r.randint(1, 3)):
-        day = r.randint(5, 28)
-        expenses.append((f"{year}-{month:02d}-{day:02d}", "transport", round(r.uniform(12, 35), 2),
-                         "Uber to campus / airport"))
+    expenses += _rows(rng, year, month, rng.integers(1, 4), (5, 28), (12, 35), "transport",
+                      "Uber to campus / airport")
 
     # Food - dining out / coffee
-    for _ in range(r.randint(4, 8)):
-        day = r.randint(1, 28)
-        amt = round(r.uniform(8, 28), 2)
-        expenses.append((f"{year}-{month:02d}-{day:02d}", "food", amt,
-                         "Coffee / lunch on campus / dinner out"))
+    expenses += _rows(rng, year, month, rng.integers(4, 9), (1, 28), (8, 28), "food",
+                      "Coffee / lunch on campus / dinner out")
 
     # Utilities - internet, phone, electric share
-    expenses.append((f"{year}-{month:02d}-15", "utilities", round(r.uniform(35, 55), 2),
+    expenses.append((f"{year}-{month:02d}-15", "utilities", round(float(rng.uniform(35, 55)), 2),
                      "Internet and phone"))
     if month in [7, 8, 12, 1, 2]:  # AC or heating
-        expenses.append((f"{year}-{month:02d}-20", "utilities", round(r.uniform(40, 75), 2),
+        expenses.append((f"{year}-{month:02d}-20", "utilities", round(float(rng.uniform(40, 75)), 2),
                          "Electric / gas (heating or AC)"))
 
     # Shopping - books, supplies, clothes
-    for _ in range(r.randint(1, 2)):
-        day = r.randint(3, 25)
-        amt = round(r.uniform(25, 120), 2)
-        expenses.append((f"{year}-{month:02d}-{day:02d}", "shopping", amt,
-                         "Books / supplies / clothes"))
+    expenses += _rows(rng, year, month, rng.integers(1, 3), (3, 25), (25, 120), "shopping",
+                      "Books / supplies / clothes")
 
     # Entertainment
-    for _ in range(r.randint(2, 4)):
-        day = r.randint(1, 28)
-        amt = round(r.uniform(15, 45), 2)
-        expenses.append((f"{year}-{month:02d}-{day:02d}", "entertainment", amt,
-                         "Movies / concert / bars with friends"))
+    expenses += _rows(rng, year, month, rng.integers(2, 5), (1, 28), (15, 45), "entertainment",
+                      "Movies / concert / bars with friends")
 
     # Healthcare - occasional
-    if r.random() < 0.4:
-        day = r.randint(1, 28)
-        amt = round(r.uniform(15, 80), 2)
-        expenses.append((f"{year}-{month:02d}-{day:02d}", "healthcare", amt,
-                         "Pharmacy / copay / health supplies"))
+    if rng.random() < 0.4:
+        expenses += _rows(rng, year, month, 1, (1, 28), (15, 80), "healthcare",
+                          "Pharmacy / copay / health supplies")
 
     # Other - misc
-    for _ in range(r.randint(0, 2)):
-        day = r.randint(1, 28)
-        amt = round(r.uniform(10, 50), 2)
-        expenses.append((f"{year}-{month:02d}-{day:02d}", "other", amt,
-                         "Miscellaneous"))
+    expenses += _rows(rng, year, month, rng.integers(0, 3), (1, 28), (10, 50), "other",
+                      "Miscellaneous")
 
     return expenses
 
@@ -102,16 +93,18 @@ def generate_monthly_expenses(year: int, month: int) -> list:
 def main():
     database.init_database()
 
-    total_added = 0
     months = (
         [(2025, m) for m in range(1, 13)] +
         [(2026, 1)]
     )
 
+    rows = []
     for year, month in months:
         for date_str, category, amount, raw_text in generate_monthly_expenses(year, month):
-            database.save_expense(date_str, category, amount, "USD", raw_text)
-            total_added += 1
+            rows.append((date_str, category, amount, "USD", raw_text))
+
+    # One transaction for all rows instead of a commit per expense
+    total_added = database.save_expenses_bulk(rows)
 
     print(f"✅ Inserted {total_added} sample expenses for Boston Master's student")
     print("   Months: Jan 2025 – Dec 2025, Jan 2026")
@@ -1,24 +1,254 @@
 import streamlit as st
-import requests
+import httpx
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
 from datetime import datetime
 from audio_recorder_streamlit import audio_recorder
+import orjson
 import plotly.express as px
 import plotly.graph_objects as go
+import plotly.io as pio
 from plotly.subplots import make_subplots
+from tsdownsample import MinMaxLTTBDownsampler
 import io
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
 # Configuration: backend URL (env or sidebar override)
 _DEFAULT_API = os.environ.get("EXPENSE_API_URL", "http://127.0.0.1:8000")
 if "api_url" not in st.session_state:
     st.session_state["api_url"] = _DEFAULT_API
 
+# Serialize Plotly figures with orjson as well
+pio.json.config.default_engine = "orjson"
+
+# Expense fields shown in tables and exports
+EXPENSE_COLUMNS = ["date", "category", "amount", "currency", "raw_text"]
+
+# Max seconds to wait for a background voice expense job
+AUDIO_JOB_TIMEOUT = 180
+
+# Default per-request timeouts (seconds); calls that wait on the LLM get the longer one.
+# Cached fetchers take them as _timeout so the timeout is not part of the cache key.
+API_TIMEOUT = 10
+LLM_TIMEOUT = 120
+
+# Max points sent to the browser for the daily time series (downsampled with MinMaxLTTB above this)
+TS_MAX_POINTS = 1000
+# Daily series with this many points or more are drawn as a plain line (no markers)
+TS_MARKER_MAX_POINTS = 90
+
 st.set_page_config(page_title="Expense Tracker", page_icon="💰", layout="wide")
 
 def get_api_url():
     return st.session_state.get("api_url", _DEFAULT_API).rstrip("/")
 
+def compact_dtypes(df):
+    """Store category/currency as Categorical (groupbys hash small int codes); amount stays float64"""
+    # float32 would save memory but its sums drift by cents on money totals
+    df["amount"] = pd.to_numeric(df["amount"], errors="coerce").astype("float64")
+    for col in ("category", "currency"):
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+    return df
+
+
+def expenses_frame(records):
+    """Build a DataFrame from expense dicts, projecting to EXPENSE_COLUMNS with explicit dtypes (no inference)"""
+    df = pd.DataFrame.from_records(
+        [tuple(e.get(k) for k in EXPENSE_COLUMNS) for e in records],
+        columns=EXPENSE_COLUMNS,
+    )
+    return compact_dtypes(df)
+
+
+def _json(response):
+    """Decode a JSON response body with orjson (much faster than the stdlib json behind response.json())"""
+    return orjson.loads(response.content)
+
+
+@st.cache_resource
+def get_client():
+    """One pooled keep-alive client shared by every rerun (module-level objects are rebuilt each rerun)"""
+    # HTTP/2 is negotiated over TLS, so it kicks in when the backend sits behind an https proxy;
+    # a plain http:// backend keeps using pooled HTTP/1.1 connections
+    transport = httpx.HTTPTransport(
+        http2=True,
+        retries=3,
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+    )
+    return httpx.Client(transport=transport, timeout=API_TIMEOUT)
+
+@st.cache_resource(ttl=30, show_spinner=False)
+def _fetch_expenses_table(api_url, version, _timeout=API_TIMEOUT):
+    """Download all expenses from the Arrow endpoint; cached per backend and data version (Arrow tables are immutable, so shared)"""
+    response = get_client().get(f"{api_url}/expenses.arrow", timeout=_timeout)
+    response.raise_for_status()
+    return pa.ipc.open_stream(response.content).read_all()
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+def fetch_expenses_in_range(api_url, version, from_date, to_date, _timeout=API_TIMEOUT):
+    """Expenses dated within [from_date, to_date]; rows are filtered in Arrow before any pandas conversion"""
+    table = _fetch_expenses_table(api_url, version, _timeout)
+    # ISO date strings sort chronologically, so the range check is a plain string comparison
+    mask = pc.and_(
+        pc.greater_equal(table["date"], from_date.isoformat()),
+        pc.less_equal(table["date"], to_date.isoformat()),
+    )
+    # Export-only rows: keep amount as float64 (no compact_dtypes) so money values serialize exactly
+    df = table.filter(mask).to_pandas()
+    df["date"] = pd.to_datetime(df["date"])
+    return df
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _fetch_expenses_version(api_url, _timeout=API_TIMEOUT):
+    """Backend data version; cached so widget reruns don't hit the network at all"""
+    response = get_client().get(f"{api_url}/expenses/version", timeout=_timeout)
+    response.raise_for_status()
+    return _json(response)["version"]
+
+
+def fetch_expenses_df(timeout=API_TIMEOUT):
+    """Fetch all expenses as a DataFrame, re-downloading only when the backend's data version changes"""
+    # Kept in session_state rather than st.cache_data, which unpickles a fresh copy on every
+    # rerun; the cached version check (ttl 30s) decides when it is rebuilt
+    key = (get_api_url(), _fetch_expenses_version(get_api_url(), timeout))
+    if st.session_state.get("expenses_key") != key:
+        st.session_state["expenses_df"] = compact_dtypes(_fetch_expenses_table(*key, timeout).to_pandas())
+        st.session_state["expenses_key"] = key
+    return st.session_state["expenses_df"]
+
+
+def invalidate_expenses():
+    """Drop cached expenses so the next fetch sees new data (after adding or on Refresh)"""
+    _fetch_expenses_version.clear()
+
+    # Results prefetched at the start of this run are stale now
+    _prefetched.clear()
+
+
+@st.cache_data(ttl=10, show_spinner=False)
+def check_api(api_url):
+    """Status code of the backend's root endpoint, or None when it can't be reached; cached briefly so reruns don't ping"""
+    try:
+        return get_client().get(f"{api_url}/", timeout=3).status_code
+    except Exception:
+        return None
+
+
+def prefetched(name, fetch):
+    """Result of a request started at the top of the run, or a fresh fetch if it was invalidated since"""
+    future = _prefetched.pop(name, None)
+    return future.result() if future is not None else fetch()
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+def fetch_date_range(api_url, version, _timeout=API_TIMEOUT):
+    """First and last expense date on the backend (None/None when empty); cached per data version"""
+    response = get_client().get(f"{api_url}/expenses/date-range", timeout=_timeout)
+    response.raise_for_status()
+    return _json(response)
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+def fetch_dashboard_views(api_url, version, from_date, to_date):
+    """Fetch the daily, per-category and monthly totals for a date range from the backend in parallel"""
+    params = {"from": from_date.isoformat(), "to": to_date.isoformat()}
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        futures = [
+            pool.submit(get_client().get, f"{api_url}/expenses/{view}", params=params, timeout=API_TIMEOUT)
+            for view in ("daily", "by-category", "monthly")
+        ]
+        responses = [future.result() for future in futures]
+    for response in responses:
+        response.raise_for_status()
+    daily_rows, category_rows, monthly_rows = (_json(response) for response in responses)
+    daily = pd.DataFrame.from_records(daily_rows, columns=["date", "amount"])
+    daily["date"] = pd.to_datetime(daily["date"])
+    by_cat = pd.DataFrame.from_records(category_rows, columns=["category", "amount", "count"])
+    monthly = pd.DataFrame.from_records(monthly_rows, columns=["year_month", "amount"])
+    return daily, by_cat, monthly
+
+
+def filter_date_range(df, from_date, to_date):
+    """Rows of df dated within [from_date, to_date]"""
+    dates = pd.to_datetime(df["date"], errors="coerce")
+    # Compare in datetime64 space; .dt.date would build a Python date object per row
+    mask = (dates >= pd.Timestamp(from_date)) & (dates < pd.Timestamp(to_date) + pd.Timedelta(days=1))
+    return df.loc[mask].assign(date=dates[mask])
+
+
+def compute_dashboard_views(df_range):
+    """Daily, per-category and monthly totals computed locally (same shapes as fetch_dashboard_views)"""
+    # resample bins stay in datetime64 space; min_count=1 + dropna keeps only days/months with spending
+    amounts = df_range.set_index("date")["amount"]
+    daily = amounts.resample("D").sum(min_count=1).dropna().reset_index()
+    by_cat = df_range.groupby("category", sort=False, observed=True)["amount"].agg(amount="sum", count="size").reset_index()
+    # Only the handful of resulting month labels are formatted as strings
+    monthly = amounts.resample("MS").sum(min_count=1).dropna().reset_index()
+    monthly = pd.DataFrame({"year_month": monthly["date"].dt.strftime("%Y-%m"), "amount": monthly["amount"]})
+    return daily, by_cat, monthly
+
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def local_dashboard_views(upload_id, _df, from_date, to_date):
+    """Rows in range plus their daily/category/monthly totals for an uploaded CSV, memoized per upload and range"""
+    # _df is skipped by the cache hash; the upload id identifies its contents
+    df_range = filter_date_range(_df, from_date, to_date)
+    return (df_range, *compute_dashboard_views(df_range))
+
+
+@st.cache_data(ttl=60, max_entries=8, show_spinner=False)
+def export_csv_bytes(export_key, _export_df):
+    """CSV bytes for an export; memoized by export_key (data source + date range) so reruns don't re-serialize"""
+    # to_csv(None) returns the text directly; encode once, no BytesIO copy
+    return _export_df.to_csv(index=False).encode("utf-8")
+
+
+@st.cache_data(ttl=120, max_entries=8, show_spinner=False)
+def export_xlsx_bytes(export_key, _export_df):
+    """Serialize rows to an .xlsx file, memoized like export_csv_bytes; xlsxwriter streams rows in constant memory, openpyxl is the fallback"""
+    buf_xlsx = io.BytesIO()
+    try:
+        import xlsxwriter
+    except ImportError:
+        _export_df.to_excel(buf_xlsx, index=False, engine="openpyxl")
+        return buf_xlsx.getvalue()
+    # constant_memory flushes each row once the next one starts, so rows must be written in
+    # order (pandas' to_excel writes column by column, which this mode would silently drop)
+    workbook = xlsxwriter.Workbook(buf_xlsx, {"constant_memory": True})
+    worksheet = workbook.add_worksheet("expenses")
+    worksheet.write_row(0, 0, list(_export_df.columns))
+    # write_row rejects NaN; None writes a blank cell like to_excel does (e.g. empty CSV cells)
+    cells = _export_df.astype(object).where(_export_df.notna(), None)
+    for row_idx, row in enumerate(cells.itertuples(index=False, name=None), start=1):
+        worksheet.write_row(row_idx, 0, row)
+    workbook.close()
+    return buf_xlsx.getvalue()
+
+
+def fetch_dashboard_bounds(timeout=API_TIMEOUT):
+    """Backend data version and the first/last expense date"""
+    version = _fetch_expenses_version(get_api_url(), timeout)
+    return version, fetch_date_range(get_api_url(), version, timeout)
+
+
+# The sidebar health check, the View Expenses rows and the dashboard's date bounds are
+# independent, latency-bound requests: start them together so a cold render waits for
+# the slowest one instead of their sum. Workers get the script context so st.* caches work.
+_pool = ThreadPoolExecutor(max_workers=3, initializer=add_script_run_ctx, initargs=(None, get_script_run_ctx()))
+api_status_future = _pool.submit(check_api, get_api_url())
+_prefetched = {
+    "expenses": _pool.submit(fetch_expenses_df),
+    "bounds": _pool.submit(fetch_dashboard_bounds, 5),
+}
+_pool.shutdown(wait=False)
+
 st.title("💰 AI Expense Tracker")
 st.markdown("Track expenses with voice or text - powered by local LLM")
 
@@ -43,13 +273,15 @@ with tab1:
         if text_input:
             with st.spinner("Processing..."):
                 try:
-                    response = requests.post(
+                    response = get_client().post(
                         f"{get_api_url()}/add-text-expense",
-                        json={"text": text_input}
+                        json={"text": text_input},
+                        timeout=LLM_TIMEOUT
                     )
 
                     if response.status_code == 200:
-                        data = response.json()
+                        data = _json(response)
+                        invalidate_expenses()
                         st.success("✅ Expense added successfully!")
                         st.json(data)
                     else:
@@ -76,21 +308,41 @@ with tab1:
         st.audio(audio_bytes, format="audio/wav")
 
         if st.button("Process Audio Expense", type="primary"):
-            with st.spinner("Transcribing and processing..."):
+            with st.status("Transcribing and processing...") as job_status:
                 try:
-                    files = {"file": ("audio.wav", audio_bytes, "audio/wav")}
-                    response = requests.post(
+                    # httpx streams the multipart body from the file object instead of building a second full copy
+                    files = {"file": ("audio.wav", io.BytesIO(audio_bytes), "audio/wav")}
+                    response = get_client().post(
                         f"{get_api_url()}/add-audio-expense",
-                        files=files
+                        files=files,
+                        timeout=API_TIMEOUT
                     )
 
-                    if response.status_code == 200:
-                        data = response.json()
-                        st.success("✅ Expense added from voice!")
-                        st.json(data)
+                    if response.status_code == 202:
+                        # Backend processes the audio in the background; poll the job until it finishes
+                        job_id = _json(response)["job_id"]
+                        job = {"status": "processing"}
+                        deadline = time.time() + AUDIO_JOB_TIMEOUT
+                        while job["status"] == "processing" and time.time() < deadline:
+                            time.sleep(0.5)
+                            job = _json(get_client().get(f"{get_api_url()}/jobs/{job_id}", timeout=API_TIMEOUT))
+
+                        if job["status"] == "done":
+                            job_status.update(label="Done", state="complete")
+                            invalidate_expenses()
+                            st.success("✅ Expense added from voice!")
+                            st.json(job["result"])
+                        elif job["status"] == "failed":
+                            job_status.update(label="Failed", state="error")
+                            st.error(f"Error: {job['error']}")
+                        else:
+                            job_status.update(label="Still processing", state="error")
+                            st.error("Timed out waiting for the backend. Check View Expenses later.")
                     else:
+                        job_status.update(label="Failed", state="error")
                         st.error(f"Error: {response.text}")
                 except Exception as e:
+                    job_status.update(label="Failed", state="error")
                     st.error(f"Connection error: {str(e)}")
 
 # TAB 2: View Expenses
@@ -98,37 +350,34 @@ with tab2:
     st.header("All Expenses")
 
     if st.button("🔄 Refresh Expenses"):
+        invalidate_expenses()
         st.rerun()
 
     try:
-        response = requests.get(f"{get_api_url()}/expenses")
-
-        if response.status_code == 200:
-            expenses = response.json()
-
-            if expenses:
-                df = pd.DataFrame(expenses)
-                df = df[['date', 'category', 'amount', 'currency', 'raw_text']]
-
-                st.dataframe(
-                    df,
-                    use_container_width=True,
-                    hide_index=True
-                )
-
-                # Summary stats
-                col1, col2, col3 = st.columns(3)
-                with col1:
-                    st.metric("Total Expenses", len(expenses))
-                with col2:
-                    st.metric("Categories", df['category'].nunique())
-                with col3:
-                    total = df['amount'].sum()
-                    st.metric("Total Amount", f"${total:.2f}")
-            else:
-                st.info("No expenses recorded yet")
+        df = prefetched("expenses", fetch_expenses_df)
+
+        if not df.empty:
+            df_view = df[EXPENSE_COLUMNS]
+
+            st.dataframe(
+                df_view,
+                use_container_width=True,
+                hide_index=True
+            )
+
+            # Summary stats
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("Total Expenses", len(df))
+            with col2:
+                st.metric("Categories", df['category'].nunique())
+            with col3:
+                total = df['amount'].sum()
+                st.metric("Total Amount", f"${total:.2f}")
         else:
-            st.error("Failed to fetch expenses")
+            st.info("No expenses recorded yet")
+    except httpx.HTTPStatusError:
+        st.error("Failed to fetch expenses")
     except Exception as e:
         st.error(f"Connection error: {str(e)}")
 
@@ -143,48 +392,58 @@ with tab3:
         month = st.number_input("Month", min_value=1, max_value=12, value=datetime.now().month)
 
     if st.button("Generate Summary", type="primary"):
-        with st.spinner("Analyzing expenses with AI..."):
-            try:
-                response = requests.post(
-                    f"{get_api_url()}/monthly-summary",
-                    json={"year": year, "month": month}
-                )
-
-                if response.status_code == 200:
-                    data = response.json()
-
-                    st.subheader(f"📅 {year}-{month:02d} Summary")
-                    st.metric("Total Expenses", data["total_expenses"])
-
-                    st.markdown("### 🤖 AI Insights")
-                    st.write(data["summary"])
+        try:
+            response = get_client().get(
+                f"{get_api_url()}/expenses",
+                params={"year": year, "month": month},
+                timeout=API_TIMEOUT
+            )
+
+            if response.status_code == 200:
+                month_expenses = _json(response)
+
+                st.subheader(f"📅 {year}-{month:02d} Summary")
+                st.metric("Total Expenses", len(month_expenses))
+
+                # Stream AI insights so text shows up as soon as the LLM produces it
+                st.markdown("### 🤖 AI Insights")
+                with get_client().stream(
+                    "POST",
+                    f"{get_api_url()}/monthly-summary/stream",
+                    json={"year": year, "month": month},
+                    timeout=LLM_TIMEOUT
+                ) as summary_response:
+                    if summary_response.status_code == 200:
+                        st.write_stream(summary_response.iter_text())
+                    else:
+                        summary_response.read()
+                        st.error(f"Error: {summary_response.text}")
 
-                    if data["expenses"]:
-                        st.markdown("### 📋 Detailed Expenses")
-                        df = pd.DataFrame(data["expenses"])
-                        df = df[['date', 'category', 'amount', 'currency', 'raw_text']]
-                        st.dataframe(df, use_container_width=True, hide_index=True)
-                else:
-                    st.error(f"Error: {response.text}")
-            except Exception as e:
-                st.error(f"Connection error: {str(e)}")
+                if month_expenses:
+                    st.markdown("### 📋 Detailed Expenses")
+                    df = expenses_frame(month_expenses)
+                    st.dataframe(df, use_container_width=True, hide_index=True)
+            else:
+                st.error(f"Error: {response.text}")
+        except Exception as e:
+            st.error(f"Connection error: {str(e)}")
 
 # TAB 4: Power BI & Interactive visualizations
 with tab4:
     st.header("📉 Power BI & Interactive Expense Visualizations")
     st.markdown("View interactive charts below and use **Power BI** for dashboards. If the backend is unreachable, upload a CSV to visualize.")
 
-    # 1) Try API
-    expenses = None
+    # 1) Try API: only the date bounds and the aggregates are fetched, not every row
+    version = None
     try:
-        response = requests.get(f"{get_api_url()}/expenses", timeout=5)
-        if response.status_code == 200:
-            expenses = response.json()
+        version, bounds = prefetched("bounds", lambda: fetch_dashboard_bounds(5))
     except Exception:
-        pass
+        version = None
 
     # 2) Fallback: upload CSV when API unreachable
-    if expenses is None:
+    df = None
+    min_date = max_date = None
+    if version is None:
         st.warning("Could not reach the backend API. Set **Backend API URL** in the sidebar (e.g. `http://127.0.0.1:8000`) or upload a CSV to see visualizations.")
         st.caption("Expected CSV columns: date, category, amount, currency (optional), raw_text (optional)")
         uploaded = st.file_uploader("Upload expenses CSV", type=["csv"], key="viz_upload")
@@ -195,24 +454,29 @@ with tab4:
                 df_up = df_up.dropna(subset=["date"])
                 if "amount" not in df_up.columns or "category" not in df_up.columns:
                     st.error("CSV must have columns: date, category, amount")
+                elif df_up.empty:
+                    st.warning("No valid dates in expenses.")
                 else:
-                    expenses = df_up.to_dict("records")
+                    df = compact_dtypes(df_up)
+                    min_date = df["date"].min().date()
+                    max_date = df["date"].max().date()
             except Exception as e:
                 st.error(f"Could not read CSV: {e}")
-                expenses = None
-    elif not expenses:
+                df = None
+    elif bounds["min_date"] is None:
         st.info("No expenses yet. Add some in **Add Expense** or load sample data. You can also upload a CSV above to visualize.")
-
-    if expenses:
-        df = pd.DataFrame(expenses)
-        df["date"] = pd.to_datetime(df["date"], errors="coerce")
-        df = df.dropna(subset=["date"])
-        if df.empty:
+    else:
+        try:
+            min_date = datetime.fromisoformat(bounds["min_date"][:10]).date()
+            max_date = datetime.fromisoformat(bounds["max_date"][:10]).date()
+        except ValueError:
+            min_date = max_date = None
             st.warning("No valid dates in expenses.")
-        else:
-            # Date range filter
-            min_date = df["date"].min().date()
-            max_date = df["date"].max().date()
+
+    if min_date is not None:
+        # Date range filter. Inside a form, editing the dates doesn't rerun the script;
+        # the dashboard only recomputes when Apply is pressed
+        with st.form("date_range", border=False):
             col_a, col_b, col_c = st.columns([1, 1, 2])
             with col_a:
                 from_date = st.date_input(
@@ -230,75 +494,102 @@ with tab4:
                     max_value=max_date,
                     key="viz_to",
                 )
+            st.form_submit_button("Apply")
 
-            mask = (df["date"].dt.date >= from_date) & (df["date"].dt.date <= to_date)
-            df_range = df.loc[mask].copy()
-
-            if df_range.empty:
-                st.warning("No expenses in the selected date range.")
-            else:
-                # KPIs
-                total = df_range["amount"].sum()
-                count = len(df_range)
-                n_months = max(1, (to_date - from_date).days / 30)
-                avg_monthly = total / n_months
-                top_cat = df_range.groupby("category")["amount"].sum().idxmax()
-                top_cat_amount = df_range.groupby("category")["amount"].sum().max()
-
-                k1, k2, k3, k4 = st.columns(4)
-                k1.metric("Total spend", f"${total:,.2f}")
-                k2.metric("Transactions", count)
-                k3.metric("Avg monthly", f"${avg_monthly:,.2f}")
-                k4.metric("Top category", f"{top_cat} (${top_cat_amount:,.2f})")
-
-                st.divider()
-
-                # Charts row 1: Time series + Category breakdown
-                fig_ts = go.Figure()
-                daily = df_range.groupby(df_range["date"].dt.date)["amount"].sum().reset_index()
-                daily.columns = ["date", "amount"]
-                fig_ts.add_trace(
-                    go.Scatter(
-                        x=daily["date"],
-                        y=daily["amount"],
-                        mode="lines+markers",
-                        name="Daily total",
-                        line=dict(color="#3498db", width=2),
-                    )
-                )
-                fig_ts.update_layout(
-                    title="Spending over time",
-                    xaxis_title="Date",
-                    yaxis_title="Amount (USD)",
-                    template="plotly_white",
-                    height=320,
-                    margin=dict(t=40, b=40, l=50, r=20),
-                )
-
-                by_cat = df_range.groupby("category")["amount"].sum().reset_index().sort_values("amount", ascending=True)
-                fig_cat = px.bar(
-                    by_cat,
-                    x="amount",
-                    y="category",
-                    orientation="h",
-                    title="Spending by category",
-                    labels={"amount": "Amount (USD)", "category": "Category"},
-                    color="amount",
-                    color_continuous_scale="Blues",
-                )
-                fig_cat.update_layout(
-                    showlegend=False,
-                    template="plotly_white",
-                    height=320,
-                    margin=dict(t=40, b=40, l=80, r=20),
-                    yaxis=dict(autorange="reversed"),
+        by_cat = None
+        if df is None:
+            # Backend aggregates in SQL; rows are only downloaded when an export is requested
+            try:
+                daily, by_cat, monthly = fetch_dashboard_views(get_api_url(), version, from_date, to_date)
+            except Exception as e:
+                st.error(f"Connection error: {str(e)}")
+            load_export_rows = lambda: fetch_expenses_in_range(get_api_url(), version, from_date, to_date, 5)
+            export_key = ("api", get_api_url(), version, from_date, to_date)
+        else:
+            df_range, daily, by_cat, monthly = local_dashboard_views(uploaded.file_id, df, from_date, to_date)
+            load_export_rows = lambda: df_range
+            export_key = ("csv", uploaded.file_id, from_date, to_date)
+
+        if by_cat is not None and by_cat.empty:
+            st.warning("No expenses in the selected date range.")
+        elif by_cat is not None:
+            # KPIs
+            total = by_cat["amount"].sum()
+            count = int(by_cat["count"].sum())
+            n_months = max(1, (to_date - from_date).days / 30)
+            avg_monthly = total / n_months
+            # One aggregate feeds the KPIs, the bar chart and the pie
+            top = by_cat.loc[by_cat["amount"].idxmax()]
+            top_cat = top["category"]
+            top_cat_amount = top["amount"]
+
+            k1, k2, k3, k4 = st.columns(4)
+            k1.metric("Total spend", f"${total:,.2f}")
+            k2.metric("Transactions", count)
+            k3.metric("Avg monthly", f"${avg_monthly:,.2f}")
+            k4.metric("Top category", f"{top_cat} (${top_cat_amount:,.2f})")
+
+            st.divider()
+
+            # Charts row 1: Time series + Category breakdown
+            fig_ts = go.Figure()
+            if len(daily) > TS_MAX_POINTS:
+                # Keep the visual shape (peaks included) with a bounded number of points
+                x = daily["date"].to_numpy().astype("int64")
+                keep = MinMaxLTTBDownsampler().downsample(x, daily["amount"].to_numpy(), n_out=TS_MAX_POINTS)
+                daily = daily.iloc[keep]
+            # WebGL trace: stays responsive where SVG slows down on thousands of points
+            fig_ts.add_trace(
+                go.Scattergl(
+                    # Plain numpy arrays serialize straight to typed arrays, skipping per-element conversion
+                    x=daily["date"].to_numpy(),
+                    y=daily["amount"].to_numpy(),
+                    # Per-point markers only help on short ranges
+                    mode="lines+markers" if len(daily) < TS_MARKER_MAX_POINTS else "lines",
+                    name="Daily total",
+                    line=dict(color="#3498db", width=2),
                 )
-
-                c1, c2 = st.columns(2)
-                c1.plotly_chart(fig_ts, use_container_width=True)
-                c2.plotly_chart(fig_cat, use_container_width=True)
-
-                # Row 2: Pie + Monthly comparison
+            )
+            fig_ts.update_layout(
+                title="Spending over time",
+                xaxis_title="Date",
+                yaxis_title="Amount (USD)",
+                hovermode="x",
+                spikedistance=0,  # no spike-line search over every point on mouse move
+                template="plotly_white",
+                height=320,
+                margin=dict(t=40, b=40, l=50, r=20),
+                transition_duration=0,
+                uirevision="ts",  # keep the user's zoom/pan across reruns
+            )
+
+            by_cat = by_cat.sort_values("amount", ignore_index=True)
+            fig_cat = px.bar(
+                by_cat,
+                x="amount",
+                y="category",
+                orientation="h",
+                title="Spending by category",
+                labels={"amount": "Amount (USD)", "category": "Category"},
+                color="amount",
+                color_continuous_scale="Blues",
+            )
+            fig_cat.update_layout(
+                showlegend=False,
+                template="plotly_white",
+                height=320,
+                margin=dict(t=40, b=40, l=80, r=20),
+                yaxis=dict(autorange="reversed"),
+            )
+            fig_cat.update_traces(marker_line_width=0)
+
+            c1, c2 = st.columns(2)
+            c1.plotly_chart(fig_ts, use_container_width=True)
+            c2.plotly_chart(fig_cat, use_container_width=True)
+
+            # Row 2: Pie + Monthly comparison. Within a single month the pie repeats the category
+            # bar and the month chart is one bar, so skip building and sending both figures
+            if len(monthly) > 1:
                 fig_pie = px.pie(
                     by_cat,
                     values="amount",
@@ -308,8 +599,6 @@ with tab4:
                 )
                 fig_pie.update_layout(template="plotly_white", height=340, margin=dict(t=40, b=20, l=20, r=20))
 
-                df_range["year_month"] = df_range["date"].dt.to_period("M").astype(str)
-                monthly = df_range.groupby("year_month")["amount"].sum().reset_index()
                 fig_month = px.bar(
                     monthly,
                     x="year_month",
@@ -325,68 +614,74 @@ with tab4:
                     margin=dict(t=40, b=60, l=50, r=20),
                     xaxis_tickangle=-45,
                 )
+                fig_month.update_traces(marker_line_width=0)
 
                 c3, c4 = st.columns(2)
                 c3.plotly_chart(fig_pie, use_container_width=True)
                 c4.plotly_chart(fig_month, use_container_width=True)
 
-                # Export for Power BI / Tableau
-                st.divider()
-                st.subheader("Download for Power BI Desktop")
-                export_cols = [c for c in ["date", "category", "amount", "currency", "raw_text"] if c in df_range.columns]
-                export_df = df_range[export_cols].copy()
-                export_df["date"] = export_df["date"].dt.strftime("%Y-%m-%d")
+            # Export for Power BI / Tableau
+            st.divider()
+            st.subheader("Download for Power BI Desktop")
+            # Serializing CSV/Excel is costly; only do it once the user asks for the files
+            prepare_export = st.toggle("Prepare CSV / Excel downloads", key="prepare_export")
+
+            col_csv, col_xlsx, col_help = st.columns([1, 1, 2])
+            if prepare_export:
+                export_rows = load_export_rows()
+                export_cols = [c for c in EXPENSE_COLUMNS if c in export_rows.columns]
+                # assign() swaps in the formatted columns without copying the others; amounts are
+                # rounded to cents so float noise never reaches the exported files
+                export_df = export_rows.loc[:, export_cols].assign(
+                    date=export_rows["date"].dt.strftime("%Y-%m-%d"),
+                    amount=export_rows["amount"].astype("float64").round(2),
+                )
 
-                col_csv, col_xlsx, col_help = st.columns([1, 1, 2])
                 with col_csv:
-                    buf_csv = io.BytesIO()
-                    export_df.to_csv(buf_csv, index=False)
-                    buf_csv.seek(0)
                     st.download_button(
                         "Download CSV",
-                        data=buf_csv.getvalue(),
+                        data=export_csv_bytes(export_key, export_df),
                         file_name="expenses_export.csv",
                         mime="text/csv",
                         key="dl_csv",
                     )
                 with col_xlsx:
-                    buf_xlsx = io.BytesIO()
                     try:
-                        export_df.to_excel(buf_xlsx, index=False, engine="openpyxl")
-                        buf_xlsx.seek(0)
                         st.download_button(
                             "Download Excel",
-                            data=buf_xlsx.getvalue(),
+                            data=export_xlsx_bytes(export_key, export_df),
                             file_name="expenses_export.xlsx",
                             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                             key="dl_xlsx",
                         )
-                    except Exception:
-                        st.caption("Install openpyxl for Excel export")
-                with col_help:
-                    with st.expander("How to use in Power BI Desktop"):
-                        st.markdown("""
-                        **Power BI Desktop**
-                        1. Open Power BI Desktop → **Get data** → **Text/CSV** or **Excel**.
-                        2. Select the downloaded file. Load the data.
-                        3. Build visuals: use **date** (slicer/axis), **category** (legend/slicer), **amount** (values).
-                        4. Publish to Power BI Service, then use **File → Embed → Publish to web** and paste the URL above to embed here.
-                        """)
-
-                # Power BI embed section
-                st.divider()
-                st.subheader("📊 Embed Power BI report")
-                st.caption("Paste a Power BI 'Publish to web' embed URL to show your report below.")
-                embed_url = st.text_input(
-                    "Power BI embed URL",
-                    placeholder="https://app.powerbi.com/view?r=...",
-                    key="pbi_embed_url",
-                    label_visibility="collapsed",
-                )
-                if embed_url and ("powerbi.com" in embed_url or "app.powerbi.com" in embed_url):
-                    st.components.v1.iframe(embed_url, height=600, scrolling=True)
-                elif embed_url:
-                    st.caption("Enter a valid Power BI 'Publish to web' URL.")
+                    except ImportError:
+                        st.caption("Install xlsxwriter (or openpyxl) for Excel export")
+                    except Exception as e:
+                        st.error(f"Could not build Excel file: {e}")
+            with col_help:
+                with st.expander("How to use in Power BI Desktop"):
+                    st.markdown("""
+                    **Power BI Desktop**
+                    1. Open Power BI Desktop → **Get data** → **Text/CSV** or **Excel**.
+                    2. Select the downloaded file. Load the data.
+                    3. Build visuals: use **date** (slicer/axis), **category** (legend/slicer), **amount** (values).
+                    4. Publish to Power BI Service, then use **File → Embed → Publish to web** and paste the URL above to embed here.
+                    """)
+
+            # Power BI embed section
+            st.divider()
+            st.subheader("📊 Embed Power BI report")
+            st.caption("Paste a Power BI 'Publish to web' embed URL to show your report below.")
+            embed_url = st.text_input(
+                "Power BI embed URL",
+                placeholder="https://app.powerbi.com/view?r=...",
+                key="pbi_embed_url",
+                label_visibility="collapsed",
+            )
+            if embed_url and ("powerbi.com" in embed_url or "app.powerbi.com" in embed_url):
+                st.components.v1.iframe(embed_url, height=600, scrolling=True)
+            elif embed_url:
+                st.caption("Enter a valid Power BI 'Publish to web' URL.")
 
 # Sidebar
 with st.sidebar:
@@ -418,11 +713,10 @@ with st.sidebar:
 
     st.markdown("---")
     st.markdown("**API Status**")
-    try:
-        response = requests.get(f"{get_api_url()}/", timeout=3)
-        if response.status_code == 200:
-            st.success("✅ Connected")
-        else:
-            st.error("❌ API Error")
-    except Exception:
+    api_status = api_status_future.result()
+    if api_status == 200:
+        st.success("✅ Connected")
+    elif api_status is not None:
+        st.error("❌ API Error")
+    else:
         st.error("❌ Not Connected")
@@ -12,17 +12,23 @@ Setup:
   3. Run: python telegram_bot.py
 """
 import asyncio
+import heapq
 import logging
+import multiprocessing
 import os
 import re
 import sys
-import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from calendar import month_name
 
 # Backend API (same machine or remote)
 API_URL = os.environ.get("EXPENSE_API_URL", "http://127.0.0.1:8000").rstrip("/")
 TELEGRAM_TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN", "").strip()
+# Worker processes for OCR; each loads its own easyocr models
+OCR_WORKERS = int(os.environ.get("OCR_WORKERS", "2"))
 
 logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
@@ -40,8 +46,9 @@ except ImportError:
 
 try:
     import aiohttp
+    import orjson
 except ImportError:
-    print("Install: pip install aiohttp")
+    print("Install: pip install aiohttp orjson")
     sys.exit(1)
 
 # Optional OCR (easyocr); bot still works without it for text and report
@@ -56,42 +63,70 @@ except ImportError:
 MONTH_NAMES = {m.lower(): i for i, m in enumerate(month_name) if m}
 MONTH_ABBREV = {"jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
                 "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12}
+MONTHS = {**MONTH_NAMES, **MONTH_ABBREV}
 
+# Extracted receipt text by Telegram file_unique_id (LRU), so a forwarded/resent photo isn't OCR'd again
+_OCR_CACHE = OrderedDict()
+_OCR_CACHE_SIZE = 256
 
-def run_ocr(image_path: str, lang: list = None) -> str:
-    """Run OCR on image file. Returns extracted text. Sync, run in executor."""
+# Report intent parsing
+_REPORT_PHRASES = frozenset({"report", "summary", "monthly report", "monthly summary", "report this month"})
+_RE_REPORT = re.compile(r"(?:report|summary)\s+(.+)$")
+_RE_YM = re.compile(r"(\d{4})[-/](\d{1,2})")
+
+
+# easyocr loads its detection + recognition models on construction; build it once per
+# OCR worker process and reuse
+_OCR_READER = None
+_OCR_LOCK = threading.Lock()
+
+
+def _get_reader():
+    """Return the shared easyocr Reader, creating it on first use."""
+    global _OCR_READER
+    with _OCR_LOCK:
+        if _OCR_READER is None:
+            _OCR_READER = easyocr.Reader(["en"], gpu=False, verbose=False)
+        return _OCR_READER
+
+
+def _warm_ocr() -> None:
+    """Load the reader in an OCR worker; returns nothing so the model isn't pickled back to the parent."""
+    _get_reader()
+
+
+def run_ocr(image: bytes) -> str:
+    """Run OCR on encoded image bytes (JPEG/PNG). Returns extracted text. Sync, run in executor."""
     if not OCR_AVAILABLE:
         return ""
     try:
-        reader = easyocr.Reader(lang or ["en"], gpu=False, verbose=False)
-        result = reader.readtext(image_path, detail=0)
+        result = _get_reader().readtext(image, detail=0)
         return " ".join(result).strip() if result else ""
     except Exception as e:
         logger.exception("OCR error: %s", e)
         return ""
 
 
-async def call_add_expense(text: str):
+async def call_add_expense(session: aiohttp.ClientSession, text: str):
     """POST text to backend /add-text-expense. Returns (success, message)."""
     url = f"{API_URL}/add-text-expense"
     payload = {"text": text}
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=payload, timeout=aiohttp.ClientTimeout(total=90)) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    raw = (data.get("raw_text") or "")[:70]
-                    if len(data.get("raw_text") or "") > 70:
-                        raw += "..."
-                    msg = (
-                        f"✅ Added\n"
-                        f"  {data.get('date', '')} | {data.get('category', '')} | "
-                        f"{data.get('currency', '')} {data.get('amount', 0):.2f}\n"
-                        f"  \"{raw}\""
-                    )
-                    return True, msg.strip()
-                body = await resp.text()
-                return False, f"API error {resp.status}: {body[:200]}"
+        async with session.post(url, json=payload, timeout=aiohttp.ClientTimeout(total=90)) as resp:
+            if resp.status == 200:
+                data = orjson.loads(await resp.read())
+                raw = (data.get("raw_text") or "")[:70]
+                if len(data.get("raw_text") or "") > 70:
+                    raw += "..."
+                msg = (
+                    f"✅ Added\n"
+                    f"  {data.get('date', '')} | {data.get('category', '')} | "
+                    f"{data.get('currency', '')} {data.get('amount', 0):.2f}\n"
+                    f"  \"{raw}\""
+                )
+                return True, msg.strip()
+            body = await resp.text()
+            return False, f"API error {resp.status}: {body[:200]}"
     except asyncio.TimeoutError:
         return False, "Request timed out (LLM may be slow). Try again."
     except Exception as e:
@@ -99,18 +134,17 @@ async def call_add_expense(text: str):
         return False, f"Error: {str(e)}"
 
 
-async def call_monthly_summary(year: int, month: int):
+async def call_monthly_summary(session: aiohttp.ClientSession, year: int, month: int):
     """POST to /monthly-summary. Returns (success, message or data)."""
     url = f"{API_URL}/monthly-summary"
     payload = {"year": year, "month": month}
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=payload, timeout=aiohttp.ClientTimeout(total=120)) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    return True, data
-                body = await resp.text()
-                return False, f"API error {resp.status}: {body[:200]}"
+        async with session.post(url, json=payload, timeout=aiohttp.ClientTimeout(total=120)) as resp:
+            if resp.status == 200:
+                data = orjson.loads(await resp.read())
+                return True, data
+            body = await resp.text()
+            return False, f"API error {resp.status}: {body[:200]}"
     except asyncio.TimeoutError:
         return False, "Request timed out."
     except Exception as e:
@@ -118,16 +152,15 @@ async def call_monthly_summary(year: int, month: int):
         return False, str(e)
 
 
-async def call_get_expenses():
+async def call_get_expenses(session: aiohttp.ClientSession):
     """GET /expenses. Returns (success, list or error message)."""
     url = f"{API_URL}/expenses"
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, timeout=aiohttp.ClientTimeout(total=30)) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    return True, data
-                return False, f"API error {resp.status}"
+        async with session.get(url, timeout=aiohttp.ClientTimeout(total=30)) as resp:
+            if resp.status == 200:
+                data = orjson.loads(await resp.read())
+                return True, data
+            return False, f"API error {resp.status}"
     except Exception as e:
         logger.exception("call_get_expenses")
         return False, str(e)
@@ -139,12 +172,12 @@ def parse_report_intent(text: str) -> tuple:
     Returns (year, month) or (None, None) if not a report request.
     """
     t = text.strip().lower()
-    if not t or t in ("report", "summary", "monthly report", "monthly summary", "report this month"):
+    if not t or t in _REPORT_PHRASES:
         now = datetime.now()
         return now.year, now.month
 
     # "report february", "report feb", "report 2"
-    m = re.match(r"(?:report|summary)\s+(.+)$", t)
+    m = _RE_REPORT.match(t)
     if not m:
         return None, None
     rest = m.group(1).strip()
@@ -154,7 +187,7 @@ def parse_report_intent(text: str) -> tuple:
     month = None
 
     # 2025-02 or 2025/02
-    dm = re.match(r"(\d{4})[-/](\d{1,2})", rest)
+    dm = _RE_YM.match(rest)
     if dm:
         year, month = int(dm.group(1)), int(dm.group(2))
         if 1 <= month <= 12:
@@ -170,10 +203,8 @@ def parse_report_intent(text: str) -> tuple:
                 year = y
             elif 1 <= y <= 12:
                 month = y
-        elif p in MONTH_ABBREV:
-            month = MONTH_ABBREV[p]
-        elif p in MONTH_NAMES:
-            month = MONTH_NAMES[p]
+        elif p in MONTHS:
+            month = MONTHS[p]
     if month is None and rest.isdigit() and 1 <= int(rest) <= 12:
         month = int(rest)
     if month is not None and 1 <= month <= 12:
@@ -188,12 +219,15 @@ def format_report(data: dict) -> str:
     total_expenses = data.get("total_expenses", 0)
     summary = (data.get("summary") or "").strip()
     expenses = data.get("expenses") or []
-    total_amount = sum(float(e.get("amount", 0)) for e in expenses)
+    # One pass for the total and the per-category sums
+    total_amount = 0.0
     by_cat = {}
     for e in expenses:
-        c = e.get("category", "other")
-        by_cat[c] = by_cat.get(c, 0) + float(e.get("amount", 0))
-    top = sorted(by_cat.items(), key=lambda x: -x[1])[:5]
+        a = float(e.get("amount", 0) or 0)
+        total_amount += a
+        c = e.get("category") or "other"
+        by_cat[c] = by_cat.get(c, 0.0) + a
+    top = heapq.nlargest(5, by_cat.items(), key=lambda x: x[1])
     lines = [
         f"📅 Report {year}-{month:02d}",
         f"  Transactions: {total_expenses}",
@@ -239,17 +273,19 @@ async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     await update.message.reply_chat_action("typing")
     photo = update.message.photo[-1]
     try:
-        file = await context.bot.get_file(photo.file_id)
-        path = tempfile.mktemp(suffix=".jpg")
-        await file.download_to_drive(path)
-        try:
-            loop = asyncio.get_event_loop()
-            text = await loop.run_in_executor(None, run_ocr, path)
-        finally:
-            try:
-                os.unlink(path)
-            except Exception:
-                pass
+        text = _OCR_CACHE.get(photo.file_unique_id)
+        if text is not None:
+            _OCR_CACHE.move_to_end(photo.file_unique_id)
+        else:
+            file = await context.bot.get_file(photo.file_id)
+            # Keep the image in memory; easyocr decodes encoded bytes itself, no temp file needed
+            image = bytes(await file.download_as_bytearray())
+            loop = asyncio.get_running_loop()
+            text = await loop.run_in_executor(context.bot_data["ocr_pool"], run_ocr, image)
+            if text:
+                _OCR_CACHE[photo.file_unique_id] = text
+                if len(_OCR_CACHE) > _OCR_CACHE_SIZE:
+                    _OCR_CACHE.popitem(last=False)
     except Exception as e:
         logger.exception("Photo download/OCR: %s", e)
         await update.message.reply_text(f"Could not process image: {e}")
@@ -258,7 +294,7 @@ async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         await update.message.reply_text("Could not read enough text from the image. Try a clearer photo or add the expense in text.")
         return
     await update.message.reply_text(f"📷 Extracted text ({len(text)} chars). Adding expense…")
-    ok, msg = await call_add_expense(text)
+    ok, msg = await call_add_expense(context.bot_data["http"], text)
     await update.message.reply_text(msg)
 
 
@@ -272,7 +308,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     year, month = parse_report_intent(text)
     if year is not None and month is not None:
         await update.message.reply_chat_action("typing")
-        ok, result = await call_monthly_summary(year, month)
+        ok, result = await call_monthly_summary(context.bot_data["http"], year, month)
         if ok:
             msg = format_report(result)
             await update.message.reply_text(msg)
@@ -282,10 +318,38 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 
     # Add expense from text
     await update.message.reply_chat_action("typing")
-    ok, msg = await call_add_expense(text)
+    ok, msg = await call_add_expense(context.bot_data["http"], text)
     await update.message.reply_text(msg)
 
 
+async def on_startup(app: Application) -> None:
+    """Open one pooled HTTP session to the backend, reused by every handler (keep-alive, no per-message handshake)."""
+    app.bot_data["http"] = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=100, keepalive_timeout=75),
+        timeout=aiohttp.ClientTimeout(total=90),
+    )
+    if OCR_AVAILABLE:
+        # OCR (torch) holds the GIL for long stretches; run it in worker processes so the event
+        # loop stays responsive and photos are processed in parallel. Each worker loads its
+        # reader on start; one warm-up task per worker spawns them now, not on the first photo.
+        # "spawn": forking this process (event loop + resolver threads, torch loaded) can deadlock.
+        pool = ProcessPoolExecutor(
+            max_workers=OCR_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_get_reader,
+        )
+        for _ in range(OCR_WORKERS):
+            pool.submit(_warm_ocr)
+        app.bot_data["ocr_pool"] = pool
+
+
+async def on_shutdown(app: Application) -> None:
+    """Close the shared HTTP session and stop the OCR workers."""
+    await app.bot_data["http"].close()
+    if "ocr_pool" in app.bot_data:
+        app.bot_data["ocr_pool"].shutdown(wait=False, cancel_futures=True)
+
+
 def main() -> None:
     if not TELEGRAM_TOKEN:
         print("Set TELEGRAM_BOT_TOKEN (from @BotFather).")
@@ -297,7 +361,13 @@ def main() -> None:
         print("OCR: disabled (pip install easyocr for receipt/screenshot support)")
     print("Bot running. Send text, photo, or 'report'. Ctrl+C to stop.")
 
-    app = Application.builder().token(TELEGRAM_TOKEN).build()
+    app = (
+        Application.builder()
+        .token(TELEGRAM_TOKEN)
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+        .build()
+    )
     app.add_handler(CommandHandler("start", cmd_start))
     app.add_handler(CommandHandler("help", cmd_help))
     app.add_handler(MessageHandler(filters.PHOTO, handle_photo))
@@ -0,0 +1,55 @@
+import os
+import sys
+import unittest
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from llm_service import _rule_based_extract  # noqa: E402
+
+TODAY = date.today().isoformat()
+YESTERDAY = (date.today() - timedelta(days=1)).isoformat()
+
+# (input, expected fields)
+CONFIDENT = [
+    ("Spent $45 on groceries yesterday", {"date": YESTERDAY, "category": "food", "amount": 45.0, "currency": "USD"}),
+    ("Paid 2000 rupees for uber today", {"date": TODAY, "category": "transport", "amount": 2000.0, "currency": "INR"}),
+    ("Bought coffee for 5 euros", {"date": TODAY, "category": "food", "amount": 5.0, "currency": "EUR"}),
+    ("rent $1,200.50 2025-03-01", {"date": "2025-03-01", "category": "utilities", "amount": 1200.5, "currency": "USD"}),
+    ("netflix 15.99", {"date": TODAY, "category": "entertainment", "amount": 15.99, "currency": "USD"}),
+    ("coffee $5 usd", {"date": TODAY, "category": "food", "amount": 5.0, "currency": "USD"}),
+]
+
+# Inputs the fast path must hand to the LLM (None) instead of guessing
+UNSURE = [
+    "Paid $2k rent",
+    "spent $1.5k on flight",
+    "rent 1.2 thousand dollars",
+    "Spent $45 on groceries on the 5th",
+    "lunch $12 on the 3",
+    "Spent $45 on groceries last friday",
+    "uber $20 on 3/14",
+    "Spent $45 on groceries and $10 on uber",
+    "Spent $45 yesterday",
+    "coffee 4 and 5",
+    "$5 coffee and $5 snack",
+    "$20 uber, tip 5",
+    "lunch 45.567",
+    "$5 eur coffee",
+]
+
+
+class RuleBasedExtractTest(unittest.TestCase):
+    def test_confident_inputs(self):
+        for text, expected in CONFIDENT:
+            with self.subTest(text=text):
+                self.assertEqual(_rule_based_extract(text), expected)
+
+    def test_unsure_inputs_fall_back_to_llm(self):
+        for text in UNSURE:
+            with self.subTest(text=text):
+                self.assertIsNone(_rule_based_extract(text))
+
+
+if __name__ == "__main__":
+    unittest.main()